@@ -1,8 +1,12 @@
 """Base generator class."""
 
+import os
+import random
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional
 from pathlib import Path
+import numpy as np
 from pydantic import BaseModel, Field
 from .schemas import TaskPair
 
@@ -15,6 +19,7 @@ class GenerationConfig(BaseModel):
     random_seed: Optional[int] = None
     output_dir: Path = Path("data/questions")
     image_size: tuple[int, int] = (400, 400)
+    num_workers: int = 1  # 1 = serial, 0 = one process per CPU
 
 
 class BaseGenerator(ABC):
@@ -23,22 +28,40 @@ class BaseGenerator(ABC):
     def __init__(self, config: GenerationConfig):
         self.config = config
         if config.random_seed is not None:
-            import random
-            import numpy as np
             random.seed(config.random_seed)
             np.random.seed(config.random_seed)
     
     @abstractmethod
-    def generate_task_pair(self, task_id: str) -> TaskPair:
-        """Generate a single task."""
+    def generate_task_pair(self, task_id: str, rng: Optional[random.Random] = None) -> TaskPair:
+        """Generate a single task, drawing randomness from `rng` (global `random` if None)."""
         pass
     
+    def _generate_indexed(self, index: int) -> TaskPair:
+        """Generate the task at `index` with its own RNG, so results don't depend on the worker."""
+        if self.config.random_seed is not None:
+            rng = random.Random(self.config.random_seed * 1_000_003 + index)
+        else:
+            rng = random.Random()
+        return self.generate_task_pair(f"{self.config.domain}_{index:04d}", rng)
+    
     def generate_dataset(self) -> List[TaskPair]:
-        """Generate complete dataset."""
+        """Generate complete dataset, in `num_workers` processes when it is not 1."""
+        num_samples = self.config.num_samples
+        workers = min(self.config.num_workers or os.cpu_count() or 1, num_samples)
+        
+        if workers <= 1:
+            return self._collect(map(self._generate_indexed, range(num_samples)))
+        
+        chunksize = max(1, min(8, num_samples // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return self._collect(
+                executor.map(self._generate_indexed, range(num_samples), chunksize=chunksize)
+            )
+    
+    @staticmethod
+    def _collect(results) -> List[TaskPair]:
         pairs = []
-        for i in range(self.config.num_samples):
-            task_id = f"{self.config.domain}_{i:04d}"
-            pair = self.generate_task_pair(task_id)
+        for pair in results:
             pairs.append(pair)
-            print(f"  Generated: {task_id}")
+            print(f"  Generated: {pair.task_id}")
         return pairs
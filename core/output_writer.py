@@ -27,7 +27,7 @@ class OutputWriter:
         
         if task_pair.ground_truth_video and Path(task_pair.ground_truth_video).exists():
             video_src = Path(task_pair.ground_truth_video)
-            shutil.copy(video_src, task_dir / "ground_truth.mp4")
+            shutil.copy(video_src, task_dir / f"ground_truth{video_src.suffix}")
         
         return task_dir
     
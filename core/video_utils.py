@@ -1,9 +1,14 @@
 """Video generation utilities."""
 
+import itertools
+import queue
+import tempfile
+import threading
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Iterable, Tuple, Optional, Union
 from PIL import Image
 import importlib.util
+from .image_utils import ImageRenderer
 
 CV2_AVAILABLE = importlib.util.find_spec("cv2") is not None
 
@@ -14,49 +19,179 @@ else:
     cv2 = None
     np = None
 
+# ffmpegcv is imported lazily: importing it raises when no ffmpeg binary is installed
+FFMPEGCV_AVAILABLE = importlib.util.find_spec("ffmpegcv") is not None
+
+
+# Supported codecs: name -> (fourcc, container extension)
+CODECS = {
+    "mp4v": ("mp4v", ".mp4"),
+    "xvid": ("XVID", ".avi"),
+    "mjpg": ("MJPG", ".avi"),
+}
+
+# Result of the one-time NVENC probe, see VideoGenerator.nvenc_available()
+_NVENC_AVAILABLE: Optional[bool] = None
+
+
+def _probe_nvenc() -> bool:
+    """Encode a few blank frames with ffmpegcv's NVENC writer to check it works."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "probe.mp4"
+        try:
+            import ffmpegcv
+            writer = ffmpegcv.VideoWriterNV(str(path), "h264", 10)
+            frame = np.zeros((256, 256, 3), dtype=np.uint8)
+            for _ in range(3):
+                writer.write(frame)
+            writer.release()
+        except Exception:
+            return False
+        return path.exists() and path.stat().st_size > 0
+
+
+class VideoStream:
+    """
+    An open video file that frames are streamed into one at a time.
+    
+    Frames are handed to a background encoder thread through a bounded queue,
+    so the caller can render the next frame while the previous one encodes.
+    Use as a context manager, or call close() to finish the file.
+    """
+    
+    def __init__(self, writer, path: Path, size: Tuple[int, int], queue_size: int = 4):
+        self.path = path
+        self.size = size
+        self._writer = writer
+        # Reused contiguous BGR scratch buffer; the channel flip is copied into
+        # it so OpenCV never has to restride a negative-stride view. Only the
+        # encoder thread touches it.
+        width, height = size
+        self._bgr_buf = np.empty((height, width, 3), dtype=np.uint8)
+        self._pending = queue.Queue(maxsize=queue_size)
+        self._errors = []
+        self._encoder = threading.Thread(target=self._encode, daemon=True)
+        self._encoder.start()
+    
+    def write(self, frame: Union[Image.Image, "np.ndarray"]):
+        """Queue a PIL image (RGB) or uint8 BGR array of the stream's size for encoding."""
+        if self._errors:
+            raise self._errors[0]
+        self._pending.put(frame)
+    
+    def close(self):
+        """Flush queued frames and finalize the file."""
+        if self._encoder is None:
+            return
+        self._pending.put(None)
+        self._encoder.join()
+        self._encoder = None
+        self._writer.release()
+        if self._errors:
+            raise self._errors[0]
+    
+    def __enter__(self) -> "VideoStream":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _encode(self):
+        while True:
+            frame = self._pending.get()
+            if frame is None:
+                return
+            if self._errors:
+                continue
+            try:
+                self._writer.write(self._to_bgr(frame))
+            except Exception as exc:
+                self._errors.append(exc)
+    
+    def _to_bgr(self, frame: Union[Image.Image, "np.ndarray"]) -> "np.ndarray":
+        """Return a frame as a contiguous uint8 BGR array for the encoder."""
+        # Callers render at the video size; the check is compiled out under -O
+        if isinstance(frame, np.ndarray):
+            assert frame.shape[1::-1] == self.size, f"frame size {frame.shape[1::-1]} != video size {self.size}"
+            # Pre-rendered uint8 BGR frame, ready for the encoder
+            return frame
+        assert frame.size == self.size, f"frame size {frame.size} != video size {self.size}"
+        frame_rgb = ImageRenderer.ensure_rgb(frame)
+        np.copyto(self._bgr_buf, np.asarray(frame_rgb)[..., ::-1])
+        return self._bgr_buf
+
 
 class VideoGenerator:
     """Generate videos from image sequences."""
     
-    def __init__(self, fps: int = 10, output_format: str = "mp4"):
+    def __init__(self, fps: int = 10, output_format: str = "mp4", codec: Optional[str] = None):
+        """
+        `codec` is one of CODECS, "nvenc" (h264 on an NVIDIA GPU via ffmpegcv)
+        or "auto", which uses NVENC when it works here and mp4v otherwise.
+        Defaults to mp4v/xvid depending on `output_format`.
+        """
         self.fps = fps
         self.output_format = output_format
-        self.codec = 'mp4v' if output_format == "mp4" else 'XVID'
-        self.extension = '.mp4' if output_format == "mp4" else '.avi'
         
         if not CV2_AVAILABLE:
             raise ImportError("opencv-python is required for video generation")
+        
+        if codec is None:
+            codec = "mp4v" if output_format == "mp4" else "xvid"
+        if codec == "auto":
+            codec = "nvenc" if self.nvenc_available() else "mp4v"
+        
+        self.use_nvenc = codec == "nvenc"
+        if self.use_nvenc:
+            if not self.nvenc_available():
+                raise ImportError("NVENC encoding requires ffmpegcv, ffmpeg and an NVIDIA GPU")
+            self.codec, self.extension = "h264", ".mp4"
+        elif codec in CODECS:
+            self.codec, self.extension = CODECS[codec]
+        else:
+            raise ValueError(f"Unsupported codec {codec!r}, expected one of {sorted(CODECS)}, 'nvenc' or 'auto'")
     
     @staticmethod
     def is_available() -> bool:
         return CV2_AVAILABLE
     
+    @staticmethod
+    def nvenc_available() -> bool:
+        """Whether GPU h264 encoding via ffmpegcv works here; probed once per process."""
+        global _NVENC_AVAILABLE
+        if _NVENC_AVAILABLE is None:
+            _NVENC_AVAILABLE = FFMPEGCV_AVAILABLE and CV2_AVAILABLE and _probe_nvenc()
+        return _NVENC_AVAILABLE
+    
+    def begin(self, output_path: Path, size: Tuple[int, int], queue_size: int = 4) -> VideoStream:
+        """Open a video file for streaming frames of the given (width, height)."""
+        output_path = Path(output_path).with_suffix(self.extension)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        if self.use_nvenc:
+            # ffmpegcv writers take BGR arrays and infer the size from the first frame
+            import ffmpegcv
+            writer = ffmpegcv.VideoWriterNV(str(output_path), self.codec, self.fps)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*self.codec)
+            writer = cv2.VideoWriter(str(output_path), fourcc, self.fps, tuple(size))
+        return VideoStream(writer, output_path, tuple(size), queue_size=queue_size)
+    
     def create_video_from_frames(
         self,
-        frames: List[Image.Image],
+        frames: Iterable[Union[Image.Image, "np.ndarray"]],
         output_path: Path,
         size: Optional[Tuple[int, int]] = None
     ) -> Path:
-        if not frames:
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
             raise ValueError("No frames provided")
         
         if size is None:
-            size = frames[0].size
-        
-        width, height = size
-        output_path = Path(output_path).with_suffix(self.extension)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        fourcc = cv2.VideoWriter_fourcc(*self.codec)
-        writer = cv2.VideoWriter(str(output_path), fourcc, self.fps, (width, height))
-        
-        for frame in frames:
-            if frame.size != size:
-                frame = frame.resize(size, Image.Resampling.LANCZOS)
-            frame_rgb = frame.convert('RGB')
-            frame_array = np.array(frame_rgb)
-            frame_bgr = cv2.cvtColor(frame_array, cv2.COLOR_RGB2BGR)
-            writer.write(frame_bgr)
+            size = (first.shape[1], first.shape[0]) if isinstance(first, np.ndarray) else first.size
         
-        writer.release()
-        return output_path
+        with self.begin(output_path, size) as stream:
+            for frame in itertools.chain([first], frames):
+                stream.write(frame)
+        return stream.path
@@ -17,6 +17,8 @@ def main():
     parser.add_argument("--output", type=str, default="data/questions")
     parser.add_argument("--seed", type=int, default=None)
     parser.add_argument("--no-videos", action="store_true")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (default: 1 = serial, 0 = one per CPU)")
     
     args = parser.parse_args()
     
@@ -27,6 +29,7 @@ def main():
         random_seed=args.seed,
         output_dir=Path(args.output),
         generate_videos=not args.no_videos,
+        num_workers=args.workers,
     )
     
     generator = TaskGenerator(config)
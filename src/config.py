@@ -19,6 +19,10 @@ class TaskConfig(GenerationConfig):
     
     generate_videos: bool = Field(default=True)
     video_fps: int = Field(default=10)
+    video_codec: str = Field(
+        default="auto",
+        description="Video codec: auto (NVENC h264 if available, else mp4v), nvenc, mp4v (.mp4), mjpg (.avi) or xvid (.avi)",
+    )
     
     # Container settings
     min_container_width: int = Field(default=60, description="Minimum container width")
@@ -7,31 +7,77 @@ Task: Predict the water level when water is poured from one container to another
 
 import random
 import tempfile
-import math
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 from core import BaseGenerator, TaskPair, ImageRenderer
-from core.video_utils import VideoGenerator
+from core.video_utils import VideoGenerator, cv2
 from .config import TaskConfig
 from .prompts import get_prompt
 
 
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+BOLD_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+# Pouring stream: positions along the stream and its downward sag at each one
+_STREAM_T = np.linspace(0, 1, 10)
+_STREAM_SAG = 20 * np.sin(_STREAM_T * np.pi)
+
+
+@dataclass(frozen=True, slots=True)
+class SceneGeometry:
+    """Container placement for one task, shared by all of its frames."""
+    start_x: int
+    target_x: int
+    container_y: int
+    source_width: int
+    source_height: int
+    target_width: int
+    target_height: int
+
+
 class TaskGenerator(BaseGenerator):
     """Water level prediction task generator."""
     
+    # Loaded fonts keyed by (path, size), shared across instances
+    _FONT_CACHE: dict[tuple[str, int], ImageFont.ImageFont] = {}
+    
     def __init__(self, config: TaskConfig):
         super().__init__(config)
         self.renderer = ImageRenderer(image_size=config.image_size)
         
         self.video_generator = None
         if config.generate_videos and VideoGenerator.is_available():
-            self.video_generator = VideoGenerator(fps=config.video_fps, output_format="mp4")
+            self.video_generator = VideoGenerator(fps=config.video_fps, codec=config.video_codec)
+        
+        # BGR palette for the animation frames, which go straight to OpenCV
+        self._bg_bgr = tuple(config.bg_color[::-1])
+        self._container_bgr = tuple(config.container_color[::-1])
+        self._water_bgr = tuple(config.water_color[2::-1])
     
-    def generate_task_pair(self, task_id: str) -> TaskPair:
+    @classmethod
+    def _get_font(cls, size: int, bold: bool = False) -> ImageFont.ImageFont:
+        """Load a DejaVu font once, falling back to PIL's default font."""
+        path = BOLD_FONT_PATH if bold else FONT_PATH
+        key = (path, size)
+        font = cls._FONT_CACHE.get(key)
+        if font is None:
+            try:
+                font = ImageFont.truetype(path, size)
+            except (OSError, ImportError):
+                # Missing font file, or Pillow built without FreeType
+                font = ImageFont.load_default()
+            cls._FONT_CACHE[key] = font
+        return font
+    
+    def generate_task_pair(self, task_id: str, rng: Optional[random.Random] = None) -> TaskPair:
         """Generate one task pair."""
-        task_data = self._generate_task_data()
+        # The module-level functions share the global generator
+        rng = rng or random
+        task_data = self._generate_task_data(rng)
         
         first_image = self._render_initial_state(task_data)
         final_image = self._render_final_state(task_data)
@@ -40,7 +86,7 @@ class TaskGenerator(BaseGenerator):
         if self.config.generate_videos and self.video_generator:
             video_path = self._generate_video(first_image, final_image, task_id, task_data)
         
-        prompt = get_prompt(task_data.get("type", "default"))
+        prompt = get_prompt(task_data.get("type", "default"), rng)
         
         return TaskPair(
             task_id=task_id,
@@ -51,21 +97,21 @@ class TaskGenerator(BaseGenerator):
             ground_truth_video=video_path
         )
     
-    def _generate_task_data(self) -> dict:
+    def _generate_task_data(self, rng: random.Random) -> dict:
         """Generate container dimensions and water volume."""
         # Source container dimensions
-        source_width = random.randint(self.config.min_container_width, self.config.max_container_width)
+        source_width = rng.randint(self.config.min_container_width, self.config.max_container_width)
         source_height = self.config.container_height
         
         # Target container dimensions (different width)
-        target_width = random.randint(self.config.min_container_width, self.config.max_container_width)
+        target_width = rng.randint(self.config.min_container_width, self.config.max_container_width)
         # Ensure target is meaningfully different
         while abs(target_width - source_width) < 20:
-            target_width = random.randint(self.config.min_container_width, self.config.max_container_width)
+            target_width = rng.randint(self.config.min_container_width, self.config.max_container_width)
         target_height = self.config.container_height
         
         # Water fill ratio in source
-        source_fill = random.uniform(self.config.min_fill_ratio, self.config.max_fill_ratio)
+        source_fill = rng.uniform(self.config.min_fill_ratio, self.config.max_fill_ratio)
         source_water_height = int(source_height * source_fill)
         
         # Calculate water volume (cross-sectional area * height)
@@ -95,12 +141,32 @@ class TaskGenerator(BaseGenerator):
             "type": "default",
         }
     
+    def _scene_geometry(self, task_data: dict) -> SceneGeometry:
+        """Position both containers side by side, centred in the image."""
+        width, height = self.config.image_size
+        source_width = task_data["source_width"]
+        source_height = task_data["source_height"]
+        
+        gap = 80
+        total_width = source_width + task_data["target_width"] + gap
+        start_x = (width - total_width) // 2
+        return SceneGeometry(
+            start_x=start_x,
+            target_x=start_x + source_width + gap,
+            container_y=(height - source_height) // 2,
+            source_width=source_width,
+            source_height=source_height,
+            target_width=task_data["target_width"],
+            target_height=task_data["target_height"],
+        )
+    
     def _draw_container(self, draw: ImageDraw.Draw, x: int, y: int, 
                         width: int, height: int, water_height: int, 
-                        show_measurements: bool = True, label: str = None):
+                        show_measurements: bool = True, label: str = None,
+                        container_color: Optional[Tuple[int, int, int]] = None):
         """Draw a container with water and measurement markings."""
         # Container outline (open top)
-        container_color = self.config.container_color
+        container_color = container_color or self.config.container_color
         wall_thickness = 4
         
         # Left wall
@@ -120,13 +186,7 @@ class TaskGenerator(BaseGenerator):
                 fill=water_color
             )
             # Add wave effect at top
-            for i in range(0, width - wall_thickness, 10):
-                wave_offset = int(3 * math.sin(i * 0.3))
-                draw.ellipse(
-                    [x + wall_thickness + i - 3, water_y + wave_offset - 3,
-                     x + wall_thickness + i + 3, water_y + wave_offset + 3],
-                    fill=water_color
-                )
+            draw.polygon(self._wave_polygon(x, width, water_y).ravel().tolist(), fill=water_color)
         
         # Measurement lines
         if show_measurements:
@@ -140,15 +200,25 @@ class TaskGenerator(BaseGenerator):
         
         # Label
         if label:
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 16)
-            except:
-                font = ImageFont.load_default()
+            font = self._get_font(16, bold=True)
             bbox = draw.textbbox((0, 0), label, font=font)
             text_width = bbox[2] - bbox[0]
             draw.text((x + width // 2 - text_width // 2, y + height + 15), 
                      label, fill=(100, 100, 100), font=font)
     
+    @staticmethod
+    def _wave_polygon(x: int, width: int, water_y: int) -> np.ndarray:
+        """Outline of the wavy water surface as an (N, 2) int32 point array."""
+        wall_thickness = 4
+        offsets = np.arange(0, width - wall_thickness, 10)
+        crests = (3 * np.sin(offsets * 0.3)).astype(np.int32) - 3
+        points = np.empty((len(offsets) + 2, 2), dtype=np.int32)
+        points[0] = (x + wall_thickness, water_y)
+        points[1:-1, 0] = x + wall_thickness + offsets
+        points[1:-1, 1] = water_y + crests
+        points[-1] = (x + width, water_y)
+        return points
+    
     def _draw_water_level_indicator(self, draw: ImageDraw.Draw, x: int, y: int, 
                                      width: int, height: int, water_height: int):
         """Draw an arrow pointing to the water level."""
@@ -166,10 +236,7 @@ class TaskGenerator(BaseGenerator):
         ], fill=self.config.measurement_color)
         
         # Level text
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-        except:
-            font = ImageFont.load_default()
+        font = self._get_font(14)
         draw.text((arrow_x + 35, water_y - 10), f"{water_height}px", 
                  fill=self.config.measurement_color, font=font)
     
@@ -178,32 +245,20 @@ class TaskGenerator(BaseGenerator):
         width, height = self.config.image_size
         img = Image.new('RGB', (width, height), self.config.bg_color)
         draw = ImageDraw.Draw(img)
-        
-        source_width = task_data["source_width"]
-        source_height = task_data["source_height"]
-        source_water_height = task_data["source_water_height"]
-        target_width = task_data["target_width"]
-        target_height = task_data["target_height"]
-        
-        # Position containers
-        gap = 80
-        total_width = source_width + target_width + gap
-        start_x = (width - total_width) // 2
-        container_y = (height - source_height) // 2
+        geom = self._scene_geometry(task_data)
         
         # Draw source container with water
-        self._draw_container(draw, start_x, container_y, source_width, source_height,
-                           source_water_height, show_measurements=True, label="A (Source)")
+        self._draw_container(draw, geom.start_x, geom.container_y, geom.source_width, geom.source_height,
+                           task_data["source_water_height"], show_measurements=True, label="A (Source)")
         
         # Draw empty target container
-        target_x = start_x + source_width + gap
-        self._draw_container(draw, target_x, container_y, target_width, target_height,
+        self._draw_container(draw, geom.target_x, geom.container_y, geom.target_width, geom.target_height,
                            0, show_measurements=True, label="B (Target)")
         
         # Draw arrow between containers
-        arrow_y = container_y + source_height // 2
-        arrow_start = start_x + source_width + 20
-        arrow_end = target_x - 15
+        arrow_y = geom.container_y + geom.source_height // 2
+        arrow_start = geom.start_x + geom.source_width + 20
+        arrow_end = geom.target_x - 15
         draw.line([(arrow_start, arrow_y), (arrow_end, arrow_y)], fill=(100, 100, 100), width=3)
         draw.polygon([
             (arrow_end, arrow_y),
@@ -212,11 +267,8 @@ class TaskGenerator(BaseGenerator):
         ], fill=(100, 100, 100))
         
         # Draw question mark on target
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 48)
-        except:
-            font = ImageFont.load_default()
-        draw.text((target_x + target_width // 2 - 15, container_y + target_height // 2 - 25),
+        font = self._get_font(48, bold=True)
+        draw.text((geom.target_x + geom.target_width // 2 - 15, geom.container_y + geom.target_height // 2 - 25),
                  "?", fill=(200, 200, 200), font=font)
         
         return img
@@ -226,31 +278,20 @@ class TaskGenerator(BaseGenerator):
         width, height = self.config.image_size
         img = Image.new('RGB', (width, height), self.config.bg_color)
         draw = ImageDraw.Draw(img)
-        
-        source_width = task_data["source_width"]
-        source_height = task_data["source_height"]
-        target_width = task_data["target_width"]
-        target_height = task_data["target_height"]
+        geom = self._scene_geometry(task_data)
         target_water_height = task_data["target_water_height"]
         
-        # Position containers
-        gap = 80
-        total_width = source_width + target_width + gap
-        start_x = (width - total_width) // 2
-        container_y = (height - source_height) // 2
-        
         # Draw empty source container
-        self._draw_container(draw, start_x, container_y, source_width, source_height,
+        self._draw_container(draw, geom.start_x, geom.container_y, geom.source_width, geom.source_height,
                            0, show_measurements=True, label="A (Empty)")
         
         # Draw target container with water
-        target_x = start_x + source_width + gap
-        self._draw_container(draw, target_x, container_y, target_width, target_height,
+        self._draw_container(draw, geom.target_x, geom.container_y, geom.target_width, geom.target_height,
                            target_water_height, show_measurements=True, label="B (Filled)")
         
         # Draw water level indicator
-        self._draw_water_level_indicator(draw, target_x, container_y, target_width, 
-                                        target_height, target_water_height)
+        self._draw_water_level_indicator(draw, geom.target_x, geom.container_y, geom.target_width,
+                                        geom.target_height, target_water_height)
         
         return img
     
@@ -259,78 +300,103 @@ class TaskGenerator(BaseGenerator):
         """Generate video showing water pouring animation."""
         temp_dir = Path(tempfile.gettempdir()) / f"{self.config.domain}_videos"
         temp_dir.mkdir(parents=True, exist_ok=True)
-        video_path = temp_dir / f"{task_id}_ground_truth.mp4"
+        video_path = temp_dir / f"{task_id}_ground_truth"
         
-        frames = []
         hold_frames = 5
         animation_frames = 30
         
-        # Hold initial
-        for _ in range(hold_frames):
-            frames.append(first_image.copy())
-        
-        # Animate water transfer
-        source_water = task_data["source_water_height"]
-        target_water = task_data["target_water_height"]
-        
-        for i in range(animation_frames):
-            progress = i / (animation_frames - 1)
-            # Ease out curve
-            progress = 1 - (1 - progress) ** 2
+        # Frames are streamed to the encoder as they are rendered
+        with self.video_generator.begin(video_path, self.config.image_size) as stream:
+            # Hold initial, converted to BGR once rather than per frame
+            first_bgr = np.asarray(first_image)[..., ::-1].copy()
+            for _ in range(hold_frames):
+                stream.write(first_bgr)
             
-            current_source = int(source_water * (1 - progress))
-            current_target = int(target_water * progress)
+            # Animate water transfer on top of the static containers
+            geom = self._scene_geometry(task_data)
+            static = self._build_static_scene(geom)
             
-            frame = self._render_transfer_frame(task_data, current_source, current_target, progress)
-            frames.append(frame)
-        
-        # Hold final
-        for _ in range(hold_frames * 2):
-            frames.append(final_image.copy())
+            # Ease out curve and the water heights it implies, for all frames at once
+            progress = 1 - (1 - np.linspace(0, 1, animation_frames)) ** 2
+            source_heights = (task_data["source_water_height"] * (1 - progress)).astype(np.int32)
+            target_heights = (task_data["target_water_height"] * progress).astype(np.int32)
+            
+            for frame in self._render_transfer_frames_np(static, geom, source_heights,
+                                                         target_heights, progress):
+                stream.write(frame)
+            
+            # Hold final
+            final_bgr = np.asarray(final_image)[..., ::-1].copy()
+            for _ in range(hold_frames * 2):
+                stream.write(final_bgr)
         
-        result = self.video_generator.create_video_from_frames(frames, video_path)
-        return str(result) if result else None
+        return str(stream.path)
     
-    def _render_transfer_frame(self, task_data: dict, source_water: int, 
-                               target_water: int, progress: float) -> Image.Image:
-        """Render a frame during water transfer."""
-        width, height = self.config.image_size
-        img = Image.new('RGB', (width, height), self.config.bg_color)
+    def _build_static_scene(self, geom: SceneGeometry) -> np.ndarray:
+        """Render the empty, labelled containers once per task as a BGR array."""
+        # Drawn with the BGR palette, so the image bytes are already in OpenCV
+        # order; the grey label colour reads the same either way.
+        img = Image.new('RGB', self.config.image_size, self._bg_bgr)
         draw = ImageDraw.Draw(img)
         
-        source_width = task_data["source_width"]
-        source_height = task_data["source_height"]
-        target_width = task_data["target_width"]
-        target_height = task_data["target_height"]
+        self._draw_container(draw, geom.start_x, geom.container_y, geom.source_width, geom.source_height,
+                           0, show_measurements=False, label="A", container_color=self._container_bgr)
+        self._draw_container(draw, geom.target_x, geom.container_y, geom.target_width, geom.target_height,
+                           0, show_measurements=False, label="B", container_color=self._container_bgr)
         
-        # Position containers
-        gap = 80
-        total_width = source_width + target_width + gap
-        start_x = (width - total_width) // 2
-        container_y = (height - source_height) // 2
-        
-        # Draw source container
-        self._draw_container(draw, start_x, container_y, source_width, source_height,
-                           source_water, show_measurements=False, label="A")
+        return np.array(img)
+    
+    def _draw_water_np(self, frame: np.ndarray, x: int, y: int, width: int, height: int,
+                       water_height: int):
+        """Draw water into a container on a BGR frame (animation counterpart of _draw_container)."""
+        if water_height <= 0:
+            return
+        wall_thickness = 4
+        water_y = y + height - water_height
+        # Slice bounds match PIL's inclusive [x0, y0, x1, y1] rectangle, clamped
+        # at 0 so off-canvas containers clip like PIL instead of wrapping around
+        frame[max(0, water_y):max(0, y + height + 1),
+              max(0, x + wall_thickness):max(0, x + width + 1)] = self._water_bgr
+        # Add wave effect at top
+        cv2.fillPoly(frame, [self._wave_polygon(x, width, water_y)], self._water_bgr)
+    
+    def _render_transfer_frames_np(self, static: np.ndarray, geom: SceneGeometry,
+                                   source_heights: np.ndarray, target_heights: np.ndarray,
+                                   progress: np.ndarray) -> Iterator[np.ndarray]:
+        """
+        Render the water transfer frames into one (N, H, W, 3) BGR array.
+        
+        Each frame is yielded as a view as soon as it is painted, so the
+        encoder can start on it while the next one renders.
+        """
+        frames = np.broadcast_to(static, (len(progress),) + static.shape).copy()
+        for frame, source_water, target_water, frame_progress in zip(
+            frames, source_heights.tolist(), target_heights.tolist(), progress.tolist()
+        ):
+            self._draw_transfer_np(frame, geom, source_water, target_water, frame_progress)
+            yield frame
+    
+    def _draw_transfer_np(self, frame: np.ndarray, geom: SceneGeometry, source_water: int,
+                          target_water: int, progress: float):
+        """Draw the water and pouring stream of one transfer frame onto the static scene."""
+        # Fill source container
+        self._draw_water_np(frame, geom.start_x, geom.container_y, geom.source_width,
+                            geom.source_height, source_water)
         
-        # Draw target container
-        target_x = start_x + source_width + gap
-        self._draw_container(draw, target_x, container_y, target_width, target_height,
-                           target_water, show_measurements=False, label="B")
+        # Fill target container
+        self._draw_water_np(frame, geom.target_x, geom.container_y, geom.target_width,
+                            geom.target_height, target_water)
         
         # Draw pouring water stream (if in progress)
         if 0 < progress < 1:
-            stream_start_x = start_x + source_width + 10
-            stream_end_x = target_x - 5
-            stream_y_start = container_y + source_height - source_water
-            stream_y_end = container_y + target_height - target_water
+            stream_start_x = geom.start_x + geom.source_width + 10
+            stream_end_x = geom.target_x - 5
+            stream_y_start = geom.container_y + geom.source_height - source_water
+            stream_y_end = geom.container_y + geom.target_height - target_water
             
-            water_color = self.config.water_color[:3]
-            # Draw curved stream
-            for t in range(10):
-                t_ratio = t / 9
-                x = stream_start_x + (stream_end_x - stream_start_x) * t_ratio
-                y = stream_y_start + (stream_y_end - stream_y_start) * t_ratio + 20 * math.sin(t_ratio * math.pi)
-                draw.ellipse([x - 4, y - 4, x + 4, y + 4], fill=water_color)
-        
-        return img
+            # Draw curved stream as a single antialiased polyline
+            points = np.empty((len(_STREAM_T), 2), dtype=np.int32)
+            points[:, 0] = np.rint(stream_start_x + (stream_end_x - stream_start_x) * _STREAM_T)
+            points[:, 1] = np.rint(stream_y_start + (stream_y_end - stream_y_start) * _STREAM_T + _STREAM_SAG)
+            cv2.polylines(frame, [points], False, self._water_bgr,
+                          thickness=8, lineType=cv2.LINE_AA)
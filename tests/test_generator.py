@@ -0,0 +1,30 @@
+"""Tests for the water level task generator."""
+
+import numpy as np
+
+from src import TaskConfig, TaskGenerator
+
+
+def test_transfer_frame_clips_containers_wider_than_image():
+    generator = TaskGenerator(TaskConfig(num_samples=1, image_size=(320, 320), generate_videos=False))
+    task_data = {
+        "source_width": 150,
+        "source_height": 200,
+        "source_water_height": 100,
+        "target_width": 120,
+        "target_height": 200,
+        "target_water_height": 125,
+    }
+    geom = generator._scene_geometry(task_data)
+    assert geom.start_x < 0
+
+    static = generator._build_static_scene(geom)
+    frame = next(iter(generator._render_transfer_frames_np(
+        static, geom, np.array([100]), np.array([0]), np.array([0.0])
+    )))
+
+    assert frame.shape == (320, 320, 3)
+    # The on-canvas part of the source water is filled, not dropped by a wrapped slice
+    bottom = geom.container_y + geom.source_height
+    water = frame[bottom - 100:bottom + 1, 0:geom.start_x + geom.source_width + 1]
+    assert (water == generator._water_bgr).all()